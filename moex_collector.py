@@ -1,48 +1,100 @@
 # moex_collector.py
 import argparse
+import csv
+import io
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+try:
+    # Опциональный быстрый JSON-декодер (~2-3x быстрее stdlib на ответах MOEX)
+    import orjson
+except ImportError:
+    orjson = None
 import psycopg2
+from psycopg2.extras import execute_values
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 import configparser
+import queue
+import threading
+import logging
 import os
 import sys
 
+logger = logging.getLogger(__name__)
+
 
 # --- Configuration ---
 CONFIG_FILE = 'config.conf'
 SECRETS_FILE = 'secrets.conf'
 
+# Кэш разобранных конфигов по (путь, mtime) - при повторных вызовах
+# (например, из долгоживущего планировщика) файлы не перечитываются
+_config_cache = {}
+# Кэш сопоставлений столбцов API -> БД по (id(config), table_key)
+_column_mapping_cache = {}
+# Кэш скомпилированных INSERT-запросов и проекций столбцов по таблице
+_insert_sql_cache = {}
+
 def load_config(config_file=CONFIG_FILE, secrets_file=SECRETS_FILE):
-    """Loads configuration from main config and secrets files."""
+    """Loads configuration from main config and secrets files.
+
+    Parsed configs are cached by (path, mtime); repeated calls with
+    unchanged files return the cached parser without re-reading them.
+    """
+    # 0. Проверить кэш по mtime обоих файлов
+    if not os.path.exists(config_file):
+        logger.error("Main configuration file '%s' not found.", config_file)
+        sys.exit(1)
+    secrets_mtime = os.stat(secrets_file).st_mtime_ns if os.path.exists(secrets_file) else 0
+    cache_key = (config_file, os.stat(config_file).st_mtime_ns, secrets_file, secrets_mtime)
+    cached = _config_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     config = configparser.ConfigParser()
     config.optionxform = str # Сохранять регистр ключей
 
     # 1. Загрузить основной файл конфигурации
-    if not os.path.exists(config_file):
-        print(f"Error: Main configuration file '{config_file}' not found.")
-        sys.exit(1)
-    print(f"Loading main config from: {config_file}")
-    config.read(config_file)
+    # Файл читается одним блоком байтов: меньше системных вызовов, чем при
+    # построчном текстовом чтении внутри config.read()
+    logger.info("Loading main config from: %s", config_file)
+    with open(config_file, 'rb') as f:
+        config.read_string(f.read().decode('utf-8'), source=config_file)
 
     # 2. Загрузить файл с секретами (если он существует)
     if os.path.exists(secrets_file):
-        print(f"Loading secrets from: {secrets_file}")
-        config.read(secrets_file) # Загружаем секреты поверх основных настроек
+        logger.info("Loading secrets from: %s", secrets_file)
+        # Загружаем секреты поверх основных настроек
+        with open(secrets_file, 'rb') as f:
+            config.read_string(f.read().decode('utf-8'), source=secrets_file)
     else:
-        print(f"Warning: Secrets file '{secrets_file}' not found. Using defaults or environment variables if configured.")
-
-    # Проверка обязательных секций
-    required_sections = ['DATABASE', 'API', 'TABLES']
-    # Добавляем секции схем таблиц
-    for table_key in ['bonds', 'quotas', 'coupons', 'amortizations', 'offers']:
-        required_sections.append(f"TABLE_SCHEMA:{table_key}")
+        logger.warning("Secrets file '%s' not found. Using defaults or environment variables if configured.", secrets_file)
+
+    # Проверка обязательных секций одной операцией над множествами;
+    # все отсутствующие секции сообщаются сразу
+    required_sections = {'DATABASE', 'API', 'TABLES'}
+    required_sections.update(f"TABLE_SCHEMA:{table_key}"
+                             for table_key in ['bonds', 'quotas', 'coupons', 'amortizations', 'offers'])
+    missing = required_sections - set(config.sections())
+    if missing:
+        logger.error("Configuration section(s) not found: %s.", ', '.join(sorted(missing)))
+        sys.exit(1)
 
-    for section in required_sections:
-        if not config.has_section(section):
-             print(f"Error: Configuration section '[{section}]' not found.")
-             sys.exit(1)
+    # Построить все сопоставления столбцов API -> БД один раз при загрузке:
+    # get_column_mapping дальше работает как обычный dict.get, без обхода
+    # configparser и .upper() на горячем пути
+    for section in config.sections():
+        if section.startswith('TABLE_SCHEMA:'):
+            table_key = section.split(':', 1)[1]
+            _column_mapping_cache[(id(config), table_key)] = {
+                db_column_name.upper(): db_column_name
+                for db_column_name in config.options(section)
+            }
 
+    _config_cache[cache_key] = config
     return config
 
 # --- Argument Parsing ---
@@ -97,7 +149,7 @@ def get_date_range(args):
         try:
             end_date = datetime.strptime(args.date_to, "%Y-%m-%d").date()
         except ValueError:
-            print("Error: Invalid date format for --date_to. Use YYYY-MM-DD.")
+            logger.error("Invalid date format for --date_to. Use YYYY-MM-DD.")
             sys.exit(1)
     else:
         end_date = datetime.today().date()
@@ -106,89 +158,193 @@ def get_date_range(args):
         try:
             start_date = datetime.strptime(args.date_from, "%Y-%m-%d").date()
         except ValueError:
-            print("Error: Invalid date format for --date_from. Use YYYY-MM-DD.")
+            logger.error("Invalid date format for --date_from. Use YYYY-MM-DD.")
             sys.exit(1)
     else:
         start_date = end_date - timedelta(days=1) # Default to previous day
 
     if start_date > end_date:
-        print("Error: Start date cannot be after end date.")
+        logger.error("Start date cannot be after end date.")
         sys.exit(1)
 
     return start_date, end_date
 
 # --- MOEX API Interaction ---
-def fetch_moex_data(url, params=None):
+def create_session():
+    """Creates a requests.Session with a keep-alive pool and retries for MOEX calls."""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=20, pool_maxsize=50, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip'})
+    return session
+
+def fetch_moex_data(session, url, params=None):
     """Fetches data from MOEX API."""
     try:
-        # print(f"Fetching: {url} with params: {params}") # Debug print
-        response = requests.get(url, params=params, timeout=30) # Add timeout
+        logger.debug("Fetching: %s with params: %s", url, params)
+        response = session.get(url, params=params, timeout=30) # Add timeout
         response.raise_for_status()
-        return response.json()
+        # Декодировать сырые байты напрямую, минуя определение кодировки в requests
+        if orjson is not None:
+            return orjson.loads(response.content)
+        return json.loads(response.content)
     except requests.exceptions.Timeout:
-        print(f"Error: Timeout fetching data from {url}")
+        logger.error("Timeout fetching data from %s", url)
         return None
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching data from {url}: {e}")
+        logger.error("Error fetching data from %s: %s", url, e)
         return None
 
-def get_all_securities(config):
-    """Fetches the list of all bond securities."""
+# Ограничение параллелизма, чтобы не упереться в лимиты MOEX
+MAX_FETCH_WORKERS = 16
+# При большем числе ISIN выгоднее один общерыночный запрос с клиентской
+# фильтрацией, чем отдельный запрос на каждый ISIN
+ISIN_FILTER_THRESHOLD = 5
+
+def filter_page_by_isin(page, isin_set):
+    """Returns a copy of a page dict with rows limited to the given ISINs.
+
+    Matches on the ISIN column when present, otherwise SECID (for bonds
+    SECID is normally the ISIN)."""
+    columns = page.get('columns', [])
+    key_index = None
+    for key_col in ('ISIN', 'SECID'):
+        if key_col in columns:
+            key_index = columns.index(key_col)
+            break
+    if key_index is None:
+        return page
+    return dict(page, data=[row for row in page['data'] if row[key_index] in isin_set])
+
+def fetch_many(session, request_args):
+    """Fetches several MOEX URLs in parallel, preserving input order.
+
+    request_args is a list of (url, params) tuples; returns the parsed JSON
+    (or None) for each. Only the I/O-bound HTTP calls are parallelized -
+    DB writes stay on the caller's thread.
+    """
+    if len(request_args) <= 1:
+        return [fetch_moex_data(session, url, params) for url, params in request_args]
+    workers = min(MAX_FETCH_WORKERS, len(request_args))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda a: fetch_moex_data(session, a[0], a[1]), request_args))
+
+def iter_pages(session, url, base_params, block_name):
+    """Yields the '<block_name>' dict for each non-empty page of a paginated endpoint.
+
+    Reads total/pagesize from the cursor of the first response and then just
+    advances 'start' locally, instead of re-parsing the cursor block on every page.
+    """
+    params = dict(base_params)
+    start = params.get('start', 0)
+    total = None
+    pagesize = None
+
+    while True:
+        params['start'] = start
+        data = fetch_moex_data(session, url, params)
+        if not data:
+            return
+
+        block = data.get(block_name)
+        if block and block.get('data'):
+            yield block
+
+        if total is None:
+            # Первая страница: запомнить параметры курсора
+            cursor = data.get(f'{block_name}.cursor')
+            if not cursor or not cursor.get('data'):
+                return # Нет курсора - пагинации нет
+            index, total, pagesize = cursor['data'][0]
+
+        start += pagesize
+        if start >= total:
+            return
+
+def iter_in_background(iterator, maxsize=4):
+    """Runs an iterator on a worker thread, yielding its items via a queue.
+
+    Lets network-bound page fetching overlap with the DB inserts on the
+    caller's thread; the bounded queue keeps at most `maxsize` pages
+    buffered. psycopg2 stays single-threaded - only the fetch moves."""
+    q = queue.Queue(maxsize=maxsize)
+    sentinel = object()
+
+    def producer():
+        try:
+            for item in iterator:
+                q.put(item)
+            q.put(sentinel)
+        except BaseException as e: # Пробросить ошибку потребителю
+            q.put(e)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    while True:
+        item = q.get()
+        if item is sentinel:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+    thread.join()
+
+def fetch_all_pages(session, url, params, block_name):
+    """Fetches every page of a cursor-paginated MOEX endpoint.
+
+    Returns the list of '<block_name>' dicts (one per non-empty page).
+    """
+    return list(iter_pages(session, url, params, block_name))
+
+def get_all_securities(session, config):
+    """Fetches the list of all bond securities.
+
+    Returns a {'columns': [...], 'data': [...]} dict spanning all pages.
+    """
     base_url = config.get('API', 'base_url')
     securities_url = f"{base_url}/engines/stock/markets/bonds/securities.json"
-    securities = []
-    start = 0
     limit = config.getint('API', 'default_limit', fallback=100)
 
-    while True:
-        params = {'start': start, 'limit': limit}
-        data = fetch_moex_data(securities_url, params)
-        if not data or 'securities' not in data or not data['securities'].get('data'):
-            break
+    columns = None
+    rows = []
+    for page in iter_pages(session, securities_url, {'start': 0, 'limit': limit}, 'securities'):
+        if columns is None:
+            columns = page.get('columns')
+        rows.extend(page['data'])
 
-        securities.extend(data['securities']['data'])
-        # Check pagination
-        if 'securities.cursor' in data:
-             cursor_data = data['securities.cursor']['data']
-             if cursor_data and len(cursor_data) > 0:
-                 index, total, pagesize = cursor_data[0]
-                 if start + pagesize >= total:
-                     break
-                 start += pagesize
-             else:
-                 break
-        else:
-            break # No cursor info, assume done
+    if columns is None:
+        return None
+    return {'columns': columns, 'data': rows}
 
-    return securities
+def get_isin_list(args, all_securities_data=None):
+    """Determines the list of ISINs to process.
 
-def get_isin_list(args, config):
-    """Determines the list of ISINs to process."""
+    When --isin is omitted, all_securities_data must be the (already
+    fetched) result of get_all_securities - main() loads it once and
+    shares it with the bonds insert path instead of fetching twice."""
     if args.isin:
         return [isin.strip().upper() for isin in args.isin.split(',')]
-    else:
-        all_securities_data = get_all_securities(config)
-        if not all_securities_data:
-             print("Failed to fetch list of all securities.")
-             return []
-        isins = []
-        columns = None
-        if 'securities' in all_securities_data and 'columns' in all_securities_data['securities']:
-             columns = all_securities_data['securities']['columns']
-        elif 'columns' in all_securities_data:
-             columns = all_securities_data['columns']
-
-        if columns:
-            try:
-                isin_index = columns.index('ISIN')
-            except ValueError:
-                print("Error: Could not find 'ISIN' column in securities data structure.")
-                return []
-
-            for row in all_securities_data['securities']['data'] if 'securities' in all_securities_data else all_securities_data['data']:
-                if len(row) > isin_index and row[isin_index]:
-                    isins.append(row[isin_index])
-        return isins
+
+    if not all_securities_data:
+        logger.error("Failed to fetch list of all securities.")
+        return []
+
+    columns = all_securities_data.get('columns')
+    if not columns:
+        return []
+    try:
+        isin_index = columns.index('ISIN')
+    except ValueError:
+        logger.error("Could not find 'ISIN' column in securities data structure.")
+        return []
+
+    isins = []
+    for row in all_securities_data['data']:
+        if len(row) > isin_index and row[isin_index]:
+            isins.append(row[isin_index])
+    return isins
 
 # --- Database Interaction ---
 def get_db_connection(config):
@@ -203,7 +359,7 @@ def get_db_connection(config):
         )
         return conn
     except psycopg2.Error as e:
-        print(f"Error connecting to PostgreSQL: {e}")
+        logger.error("Error connecting to PostgreSQL: %s", e)
         return None
 
 def get_db_schema(config):
@@ -217,16 +373,25 @@ def clear_table(conn, table_name, config):
         with conn.cursor() as cur:
             cur.execute(f"TRUNCATE TABLE {schema}.{table_name};")
             conn.commit()
-            print(f"Table {schema}.{table_name} cleared.")
+            logger.info("Table %s.%s cleared.", schema, table_name)
     except psycopg2.Error as e:
-        print(f"Error clearing table {schema}.{table_name}: {e}")
+        logger.error("Error clearing table %s.%s: %s", schema, table_name, e)
         conn.rollback()
 
 def get_column_mapping(config, table_key):
-    """Gets the mapping of API column names to DB column names from config."""
+    """Gets the mapping of API column names to DB column names from config.
+
+    Cached per (config, table_key): insert paths call this once per page,
+    so the config.options() walk and .upper() calls run only once per table.
+    """
+    cache_key = (id(config), table_key)
+    mapping = _column_mapping_cache.get(cache_key)
+    if mapping is not None:
+        return mapping
+
     schema_section = f"TABLE_SCHEMA:{table_key}"
     if not config.has_section(schema_section):
-        print(f"Warning: Configuration section '[{schema_section}]' not found.")
+        logger.warning("Configuration section '[%s]' not found.", schema_section)
         return {}
 
     # Предполагаем, что имена ключей в конфиге - это имена столбцов в БД
@@ -235,91 +400,233 @@ def get_column_mapping(config, table_key):
     for db_column_name in config.options(schema_section):
         api_column_name = db_column_name.upper() # Предположение об именах API
         mapping[api_column_name] = db_column_name
+    _column_mapping_cache[cache_key] = mapping
     return mapping
 
-def insert_data_generic(conn, table_name, data, config, table_key):
-    """Generic function to insert data into a table, using config for column mapping."""
-    if not data or 'data' not in data or not data['data']:
-        # print(f"No data received for table {table_name}.")
-        return
-
-    schema = get_db_schema(config)
-    api_columns = data.get('columns', []) # Имена столбцов из JSON API
-    rows = data['data'] # Данные
-
-    if not api_columns:
-        print(f"No columns defined in API data for table {schema}.{table_name}.")
-        return
+def _compile_projection(config, table_key, api_columns):
+    """Maps API columns onto configured DB columns.
 
-    # Получить сопоставление имен столбцов API -> БД
+    Returns (db_columns, api_indices) tuples, or None when nothing maps.
+    MOEX column order is stable within a block, so callers can cache the result.
+    """
     column_mapping = get_column_mapping(config, table_key)
     if not column_mapping:
-        print(f"Failed to get column mapping for table {table_key}. Skipping insert.")
-        return
+        return None
 
-    # Определить, какие столбцы API присутствуют в конфиге и их порядок
     db_columns_in_order = []
     api_indices_in_order = [] # Соответствующие индексы в списке api_columns
     for i, api_col_name in enumerate(api_columns):
         if api_col_name in column_mapping:
-            db_col_name = column_mapping[api_col_name]
-            db_columns_in_order.append(db_col_name)
+            db_columns_in_order.append(column_mapping[api_col_name])
             api_indices_in_order.append(i)
-        # else:
-        #     print(f"Warning: API column '{api_col_name}' not found in config for table '{table_key}'. Skipping.")
 
     if not db_columns_in_order:
-        print(f"No matching columns found between API data and config for table {schema}.{table_name}.")
-        return
+        return None
+    return tuple(db_columns_in_order), tuple(api_indices_in_order)
 
-    # Создать SQL-запрос на основе отфильтрованных и упорядоченных столбцов
-    placeholders = ', '.join(['%s'] * len(db_columns_in_order))
-    columns_str = ', '.join([f'"{col}"' for col in db_columns_in_order])
+def _compile_insert(config, schema, table_name, table_key, api_columns, conflict_action='do_nothing'):
+    """Builds (insert_sql, api_indices) for a page's column set, memoized.
+
+    conflict_action 'do_nothing' appends ON CONFLICT DO NOTHING; 'none'
+    emits a plain INSERT for freshly truncated tables, where the arbiter
+    index check per row is pure overhead.
 
-    insert_query = f"""
+    Called once per page, but the projection walk and SQL formatting run
+    only on the first page per (table, column set)."""
+    cache_key = (id(config), schema, table_name, table_key, tuple(api_columns), conflict_action)
+    compiled = _insert_sql_cache.get(cache_key)
+    if compiled is not None:
+        return compiled
+
+    projection = _compile_projection(config, table_key, api_columns)
+    if projection is None:
+        return None
+    db_columns_in_order, api_indices_in_order = projection
+
+    columns_str = ', '.join([f'"{col}"' for col in db_columns_in_order])
+    conflict_suffix = "ON CONFLICT DO NOTHING" if conflict_action == 'do_nothing' else ""
+    insert_sql = f"""
         INSERT INTO {schema}.{table_name} ({columns_str})
-        VALUES ({placeholders})
-        ON CONFLICT DO NOTHING;
+        VALUES %s
+        {conflict_suffix};
     """
 
+    # itemgetter проецирует строку одним вызовом на уровне C;
+    # с одним индексом он возвращает скаляр, поэтому оборачиваем в кортеж
+    if len(api_indices_in_order) == 1:
+        single = itemgetter(api_indices_in_order[0])
+        getter = lambda row: (single(row),)
+    else:
+        getter = itemgetter(*api_indices_in_order)
+
+    # Ключ логического PK (по спроецированной строке) для клиентской
+    # дедупликации; None, если PK для таблицы не настроен
+    keyfn = None
+    if config.has_option('TABLE_PK', table_key):
+        pk_columns = [c.strip() for c in config.get('TABLE_PK', table_key).split(',')]
+        pk_positions = tuple(
+            db_columns_in_order.index(c) for c in pk_columns if c in db_columns_in_order
+        )
+        if len(pk_positions) == len(pk_columns):
+            keyfn = itemgetter(*pk_positions)
+
+    compiled = (insert_sql, api_indices_in_order, getter, keyfn)
+    _insert_sql_cache[cache_key] = compiled
+    return compiled
+
+def insert_data_generic(conn, table_name, data, config, table_key, conflict_action='do_nothing'):
+    """Generic function to insert data into a table, using config for column mapping.
+
+    Pass conflict_action='none' for loads into a freshly truncated table to
+    skip the per-row ON CONFLICT arbiter check."""
+    if not data or 'data' not in data or not data['data']:
+        logger.debug("No data received for table %s.", table_name)
+        return
+
+    schema = get_db_schema(config)
+    api_columns = data.get('columns', []) # Имена столбцов из JSON API
+    rows = data['data'] # Данные
+
+    if not api_columns:
+        logger.warning("No columns defined in API data for table %s.%s.", schema, table_name)
+        return
+
+    compiled = _compile_insert(config, schema, table_name, table_key, api_columns, conflict_action)
+    if compiled is None:
+        logger.warning("No matching columns found between API data and config for table %s.%s. Skipping insert.", schema, table_name)
+        return
+    insert_query, api_indices_in_order, getter, keyfn = compiled
+
+    # Отфильтровать слишком короткие строки один раз, вместо проверки на каждом столбце
+    max_index = api_indices_in_order[-1]
+    valid_rows = [row for row in rows if len(row) > max_index]
+    if len(valid_rows) != len(rows):
+        logger.debug("Skipping %d short row(s) for %s.%s.", len(rows) - len(valid_rows), schema, table_name)
+
+    # Извлечь только нужные значения из строк API в правильном порядке
+    db_rows = list(map(getter, valid_rows))
+
+    # Дедупликация по логическому PK на клиенте: проверка в set() дешевле,
+    # чем обход арбитражного индекса и запись WAL для дубликата на сервере
+    if keyfn is not None:
+        seen = set()
+        unique_rows = []
+        for db_row in db_rows:
+            key = keyfn(db_row)
+            if key not in seen:
+                seen.add(key)
+                unique_rows.append(db_row)
+        if len(unique_rows) != len(db_rows):
+            logger.debug("Dropped %d duplicate row(s) for %s.%s.", len(db_rows) - len(unique_rows), schema, table_name)
+        db_rows = unique_rows
+
+    # Фиксация транзакции - забота вызывающего кода (один commit на внешний
+    # батч); SAVEPOINT позволяет пропустить плохую страницу, не откатывая всё
     inserted_count = 0
-    try:
-        with conn.cursor() as cur:
-            for row in rows:
-                # Извлечь только нужные значения из строки API в правильном порядке
-                db_row = [row[i] if i < len(row) else None for i in api_indices_in_order]
-                cur.execute(insert_query, db_row)
-                inserted_count += cur.rowcount
-            conn.commit()
-            print(f"Attempted to insert {len(rows)} rows into {schema}.{table_name}. Rows affected: {inserted_count}.")
-    except psycopg2.Error as e:
-        print(f"Database error inserting data into {schema}.{table_name}: {e}")
-        conn.rollback()
-    except Exception as e:
-        print(f"Unexpected error during data insertion into {schema}.{table_name}: {e}")
-        conn.rollback()
+    with conn.cursor() as cur:
+        try:
+            cur.execute("SAVEPOINT page_insert;")
+            # Один многострочный INSERT вместо отдельного запроса на каждую строку
+            execute_values(cur, insert_query, db_rows, page_size=500)
+            inserted_count = cur.rowcount
+            cur.execute("RELEASE SAVEPOINT page_insert;")
+            logger.debug("Attempted to insert %d rows into %s.%s. Rows affected: %d.", len(rows), schema, table_name, inserted_count)
+        except psycopg2.Error as e:
+            logger.error("Database error inserting data into %s.%s: %s", schema, table_name, e)
+            cur.execute("ROLLBACK TO SAVEPOINT page_insert;")
+    return inserted_count
+
+def insert_data_copy(conn, table_name, data, config, table_key):
+    """Bulk-loads data into a table via COPY FROM STDIN.
+
+    Intended for freshly TRUNCATEd tables (mode 'overwrite'), where no
+    ON CONFLICT handling is needed and COPY is much faster than INSERT.
+    """
+    if not data or 'data' not in data or not data['data']:
+        return
+
+    schema = get_db_schema(config)
+    api_columns = data.get('columns', []) # Имена столбцов из JSON API
+    rows = data['data'] # Данные
+
+    if not api_columns:
+        logger.warning("No columns defined in API data for table %s.%s.", schema, table_name)
+        return
+
+    projection = _compile_projection(config, table_key, api_columns)
+    if projection is None:
+        logger.warning("No matching columns found between API data and config for table %s.%s. Skipping copy.", schema, table_name)
+        return
+    db_columns_in_order, api_indices_in_order = projection
+
+    columns_str = ', '.join([f'"{col}"' for col in db_columns_in_order])
+
+    # Сформировать CSV в памяти; None -> \N (NULL для COPY)
+    buf = io.StringIO()
+    writer = csv.writer(buf, quoting=csv.QUOTE_MINIMAL)
+    for row in rows:
+        writer.writerow([
+            row[i] if i < len(row) and row[i] is not None else '\\N'
+            for i in api_indices_in_order
+        ])
+    buf.seek(0)
+
+    copy_query = f"COPY {schema}.{table_name} ({columns_str}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')"
+
+    # Как и в insert_data_generic: commit делает вызывающий код,
+    # SAVEPOINT изолирует ошибку одной страницы
+    copied_count = 0
+    with conn.cursor() as cur:
+        try:
+            cur.execute("SAVEPOINT page_copy;")
+            cur.copy_expert(copy_query, buf)
+            copied_count = cur.rowcount
+            cur.execute("RELEASE SAVEPOINT page_copy;")
+            logger.debug("Copied %d rows into %s.%s.", copied_count, schema, table_name)
+        except psycopg2.Error as e:
+            logger.error("Database error copying data into %s.%s: %s", schema, table_name, e)
+            cur.execute("ROLLBACK TO SAVEPOINT page_copy;")
+    return copied_count
 
 
 # --- Main Logic ---
+def setup_logging(config=None):
+    """Configures logging; the level comes from [LOGGING] level (default INFO)."""
+    level_name = 'INFO'
+    if config is not None and config.has_section('LOGGING'):
+        level_name = config.get('LOGGING', 'level', fallback='INFO')
+    level = getattr(logging, level_name.upper(), logging.INFO)
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger().setLevel(level)
+
 def main():
     args = parse_arguments()
+    setup_logging()
     config = load_config(args.config, args.secrets)
+    setup_logging(config)
 
     start_date, end_date = get_date_range(args)
-    isin_list = get_isin_list(args, config)
+    # Одна сессия с keep-alive пулом на весь запуск
+    session = create_session()
+    # Полный список бумаг скачивается не более одного раза за запуск
+    securities_data = get_all_securities(session, config) if not args.isin else None
+    isin_list = get_isin_list(args, securities_data)
 
     if not isin_list and not args.isin:
-        print("No ISINs found or specified. Exiting.")
+        logger.error("No ISINs found or specified. Exiting.")
         return
 
-    print(f"Processing table: {args.table}")
-    print(f"Date range: {start_date} to {end_date}")
-    print(f"Mode: {args.mode}")
-    print(f"ISINs to process: {isin_list if args.isin else 'All'}")
+    logger.info("Processing table: %s", args.table)
+    logger.info("Date range: %s to %s", start_date, end_date)
+    logger.info("Mode: %s", args.mode)
+    logger.info("ISINs to process: %s", isin_list if args.isin else 'All')
 
     conn = get_db_connection(config)
     if not conn:
         return
+    # Явные транзакции: один commit на внешний батч (см. блоки `with conn:`),
+    # а не fsync на каждую страницу
+    conn.autocommit = False
 
     base_url = config.get('API', 'base_url')
     default_limit = config.getint('API', 'default_limit', fallback=100)
@@ -333,63 +640,62 @@ def main():
         if args.mode == 'overwrite':
             clear_table(conn, table_name, config)
 
+        # После TRUNCATE таблица пуста - можно грузить через COPY без ON CONFLICT
+        insert_fn = insert_data_copy if args.mode == 'overwrite' else insert_data_generic
+
         # --- Process based on table type ---
         if args.table == 'bonds':
             if args.isin:
-                for isin in isin_list:
-                    print(f"Fetching bond data for ISIN: {isin}")
-                    url = f"{base_url}/engines/stock/markets/bonds/securities/{isin}.json"
-                    data = fetch_moex_data(url)
-                    if data and 'description' in data and data['description'].get('data'):
-                         insert_data_generic(conn, table_name, data['description'], config, args.table)
-                    else:
-                         print(f"No data found for ISIN {isin} or unexpected structure.")
+                logger.info("Fetching bond data for %d ISIN(s) in parallel", len(isin_list))
+                request_args = [
+                    (f"{base_url}/engines/stock/markets/bonds/securities/{isin}.json", None)
+                    for isin in isin_list
+                ]
+                with conn: # Одна транзакция на весь батч ISIN
+                    for isin, data in zip(isin_list, fetch_many(session, request_args)):
+                        if data and 'description' in data and data['description'].get('data'):
+                            insert_fn(conn, table_name, data['description'], config, args.table)
+                        else:
+                            logger.warning("No data found for ISIN %s or unexpected structure.", isin)
             else:
-                 securities_data = get_all_securities(config)
-                 if securities_data:
-                     if 'securities' in securities_data and 'columns' in securities_data['securities'] and 'data' in securities_data['securities']:
-                         insert_data_generic(conn, table_name, securities_data['securities'], config, args.table)
-                     elif 'columns' in securities_data and 'data' in securities_data:
-                          insert_data_generic(conn, table_name, securities_data, config, args.table)
-                     else:
-                         print("Unexpected data structure for all securities.")
+                 # securities_data уже получен при определении списка ISIN
+                 if securities_data and securities_data.get('data'):
+                     with conn:
+                         insert_fn(conn, table_name, securities_data, config, args.table)
                  else:
-                     print("Failed to fetch data for all securities.")
+                     logger.error("Failed to fetch data for all securities.")
 
         elif args.table == 'quotas':
+            # При большом списке ISIN дешевле забрать весь рынок за дату одним
+            # пагинированным запросом и отфильтровать строки на клиенте, чем
+            # делать отдельный запрос на каждый ISIN
+            use_per_isin_endpoint = args.isin and len(isin_list) <= ISIN_FILTER_THRESHOLD
+            isin_set = frozenset(isin_list) if args.isin else None
+
             date = start_date
             while date <= end_date:
-                print(f"Fetching quota data for date: {date}")
-                if args.isin:
-                    for isin in isin_list:
-                        print(f"  -> ISIN: {isin}")
-                        url = f"{base_url}/history/engines/stock/markets/bonds/securities/{isin}.json"
-                        params = {'from': date.strftime("%Y-%m-%d"), 'till': date.strftime("%Y-%m-%d")}
-                        data = fetch_moex_data(url, params)
-                        if data and 'history' in data and data['history'].get('data'):
-                            insert_data_generic(conn, table_name, data['history'], config, args.table)
-                else:
-                     url = f"{base_url}/history/engines/stock/markets/bonds/securities.json"
-                     params = {'date': date.strftime("%Y-%m-%d"), 'start': 0, 'limit': default_limit}
-                     has_more = True
-                     while has_more:
-                         print(f"  -> Fetching page starting at {params['start']}")
-                         data = fetch_moex_data(url, params)
-                         if data and 'history' in data and data['history'].get('data'):
-                             insert_data_generic(conn, table_name, data['history'], config, args.table)
-                         else:
-                             print(f"    No data or unexpected structure for page {params['start']}.")
-
-                         has_more = False
-                         if data and 'history.cursor' in data:
-                             cursor_data = data['history.cursor']['data']
-                             if cursor_data and len(cursor_data) > 0:
-                                 index, total, pagesize = cursor_data[0]
-                                 if params['start'] + pagesize < total:
-                                     params['start'] += pagesize
-                                     has_more = True
-                         if not data:
-                             break
+                logger.info("Fetching quota data for date: %s", date)
+                with conn: # Одна транзакция на дату
+                    if use_per_isin_endpoint:
+                        date_str = date.strftime("%Y-%m-%d")
+                        request_args = [
+                            (f"{base_url}/history/engines/stock/markets/bonds/securities/{isin}.json",
+                             {'from': date_str, 'till': date_str})
+                            for isin in isin_list
+                        ]
+                        for data in fetch_many(session, request_args):
+                            if data and 'history' in data and data['history'].get('data'):
+                                insert_fn(conn, table_name, data['history'], config, args.table)
+                    else:
+                        url = f"{base_url}/history/engines/stock/markets/bonds/securities.json"
+                        params = {'date': date.strftime("%Y-%m-%d"), 'start': 0, 'limit': default_limit}
+                        # Скачивание следующей страницы идёт параллельно со вставкой текущей
+                        for page in iter_in_background(iter_pages(session, url, params, 'history')):
+                            if isin_set is not None:
+                                page = filter_page_by_isin(page, isin_set)
+                                if not page['data']:
+                                    continue
+                            insert_fn(conn, table_name, page, config, args.table)
 
                 date += timedelta(days=1)
 
@@ -402,60 +708,41 @@ def main():
             data_block = data_block_map[args.table]
 
             if args.isin:
-                for isin in isin_list:
-                    print(f"Fetching {args.table} data for ISIN: {isin}")
-                    url = f"{base_url}/statistics/engines/stock/markets/bonds/bondization/{isin}.json"
-                    params = {'limit': default_limit, 'start': 0}
-                    has_more = True
-                    while has_more:
-                        print(f"  -> Fetching page starting at {params['start']}")
-                        data = fetch_moex_data(url, params)
-                        if data and data_block in data and data[data_block].get('data'):
-                            insert_data_generic(conn, table_name, data[data_block], config, args.table)
-                        else:
-                            print(f"    No data or unexpected structure for page {params['start']} for ISIN {isin}.")
-
-                        has_more = False
-                        if data and f'{data_block}.cursor' in data:
-                            cursor_data = data[f'{data_block}.cursor']['data']
-                            if cursor_data and len(cursor_data) > 0:
-                                index, total, pagesize = cursor_data[0]
-                                if params['start'] + pagesize < total:
-                                    params['start'] += pagesize
-                                    has_more = True
-                        if not data:
-                            break
+                logger.info("Fetching %s data for %d ISIN(s) in parallel", args.table, len(isin_list))
+                workers = min(MAX_FETCH_WORKERS, len(isin_list))
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    futures = [
+                        (isin, pool.submit(
+                            fetch_all_pages, session,
+                            f"{base_url}/statistics/engines/stock/markets/bonds/bondization/{isin}.json",
+                            {'limit': default_limit, 'start': 0}, data_block))
+                        for isin in isin_list
+                    ]
+                    for isin, future in futures:
+                        pages = future.result()
+                        if not pages:
+                            logger.debug("No %s data for ISIN %s.", args.table, isin)
+                        with conn: # Одна транзакция на ISIN
+                            for page in pages:
+                                insert_fn(conn, table_name, page, config, args.table)
 
             else:
+                 logger.info("Fetching %s data for all securities", args.table)
                  url = f"{base_url}/statistics/engines/stock/markets/bonds/bondization.json"
                  params = {'limit': default_limit, 'start': 0}
-                 has_more = True
-                 while has_more:
-                     print(f"Fetching {args.table} data, page starting at {params['start']}")
-                     data = fetch_moex_data(url, params)
-                     if data and data_block in data and data[data_block].get('data'):
-                         insert_data_generic(conn, table_name, data[data_block], config, args.table)
-                     else:
-                         print(f"  No data or unexpected structure for page {params['start']}.")
-
-                     has_more = False
-                     if data and f'{data_block}.cursor' in data:
-                         cursor_data = data[f'{data_block}.cursor']['data']
-                         if cursor_data and len(cursor_data) > 0:
-                             index, total, pagesize = cursor_data[0]
-                             if params['start'] + pagesize < total:
-                                 params['start'] += pagesize
-                                 has_more = True
-                     if not data:
-                         break
+                 with conn: # Одна транзакция на весь проход
+                     # Скачивание следующей страницы идёт параллельно со вставкой текущей
+                     for page in iter_in_background(iter_pages(session, url, params, data_block)):
+                         insert_fn(conn, table_name, page, config, args.table)
 
         else:
-            print(f"Error: Unknown table type '{args.table}'.")
+            logger.error("Unknown table type '%s'.", args.table)
 
     finally:
+        session.close()
         if conn:
             conn.close()
-            print("Database connection closed.")
+            logger.info("Database connection closed.")
 
 if __name__ == "__main__":
     main()
@@ -1,24 +1,107 @@
 # table_manager.py
 import argparse
+import functools
 import psycopg2
-import configparser
+import psycopg2.pool
 import os
+import re
 import sys
+from contextlib import contextmanager
 from datetime import datetime
 
 # --- Configuration ---
+SECTION_RE = re.compile(r'^\[([^\]]+)\]\s*$')
+KV_RE = re.compile(r'^([^=\s][^=]*?)\s*=\s*(.*?)\s*$')
+
+_UNSET = object()
+
+class FastConfigParser:
+    """Minimal regex-based INI parser for plain 'key = value' configs.
+
+    Exposes the configparser subset this module uses (get/getint/items/
+    options/sections/has_section/has_option) without the interpolation
+    and line-object machinery, which dominates startup time for a
+    short-lived CLI. Keys keep their case (optionxform = str semantics);
+    ';'/'#' comment lines are skipped."""
+
+    def __init__(self):
+        self._sections = {}
+
+    def read_string(self, text, source=None):
+        current = None
+        for line in text.splitlines():
+            stripped = line.strip()
+            if not stripped or stripped.startswith((';', '#')):
+                continue
+            match = SECTION_RE.match(stripped)
+            if match:
+                current = self._sections.setdefault(match.group(1), {})
+                continue
+            match = KV_RE.match(stripped)
+            if match and current is not None:
+                current[match.group(1)] = match.group(2)
+
+    def read(self, filename):
+        with open(filename, 'r', encoding='utf-8') as f:
+            self.read_string(f.read(), source=filename)
+
+    def sections(self):
+        return list(self._sections)
+
+    def has_section(self, section):
+        return section in self._sections
+
+    def has_option(self, section, option):
+        return option in self._sections.get(section, {})
+
+    def options(self, section):
+        return list(self._sections[section])
+
+    def items(self, section):
+        return list(self._sections[section].items())
+
+    def get(self, section, option, fallback=_UNSET):
+        try:
+            return self._sections[section][option]
+        except KeyError:
+            if fallback is not _UNSET:
+                return fallback
+            raise KeyError(f"No option '{option}' in section '[{section}]'")
+
+    def getint(self, section, option, fallback=_UNSET):
+        value = self.get(section, option, fallback)
+        return int(value)
+
 DEFAULT_CONFIG_FILE = 'config.conf'
 DEFAULT_SECRETS_FILE = 'secrets.conf' # Для согласованности, хотя не используется напрямую
 
+# Кэш разобранных конфигов по (путь, mtime): повторные вызовы load_config
+# из долгоживущих процессов не перечитывают и не перепарсивают файлы
+_CFG_CACHE = {}
+
+def invalidate_config():
+    """Clears the cached parsed configs (for long-lived callers)."""
+    _CFG_CACHE.clear()
+
 def load_config(config_file=DEFAULT_CONFIG_FILE, secrets_file=DEFAULT_SECRETS_FILE):
-    """Loads configuration from main config and secrets files."""
-    config = configparser.ConfigParser()
-    config.optionxform = str # Сохранять регистр ключей
+    """Loads configuration from main config and secrets files.
 
-    # 1. Загрузить основной файл конфигурации
+    Results are memoized by file paths and mtimes; unchanged files are
+    not reparsed on repeated calls."""
     if not os.path.exists(config_file):
         print(f"Error: Main configuration file '{config_file}' not found.")
         sys.exit(1)
+    cache_key = (
+        config_file, os.path.getmtime(config_file),
+        secrets_file, os.path.getmtime(secrets_file) if os.path.exists(secrets_file) else 0.0,
+    )
+    cached = _CFG_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+
+    config = FastConfigParser()
+
+    # 1. Загрузить основной файл конфигурации
     print(f"Loading main config from: {config_file}")
     config.read(config_file)
 
@@ -29,17 +112,17 @@ def load_config(config_file=DEFAULT_CONFIG_FILE, secrets_file=DEFAULT_SECRETS_FI
         print(f"Loading secrets (for potential DB schema) from: {secrets_file}")
         config.read(secrets_file)
 
-    # Проверка обязательных секций
-    required_sections = ['DATABASE', 'API', 'TABLES']
-    # Добавляем секции схем таблиц
-    for table_key in ['bonds', 'quotas', 'coupons', 'amortizations', 'offers']:
-        required_sections.append(f"TABLE_SCHEMA:{table_key}")
-
-    for section in required_sections:
-        if not config.has_section(section):
-             print(f"Error: Configuration section '[{section}]' not found.")
-             sys.exit(1)
+    # Проверка обязательных секций одной операцией над множествами;
+    # все отсутствующие секции сообщаются сразу
+    required_sections = {'DATABASE', 'API', 'TABLES'}
+    required_sections.update(f"TABLE_SCHEMA:{table_key}"
+                             for table_key in ['bonds', 'quotas', 'coupons', 'amortizations', 'offers'])
+    missing = required_sections - set(config.sections())
+    if missing:
+        print(f"Error: Configuration section(s) not found: {', '.join(sorted(missing))}.")
+        sys.exit(1)
 
+    _CFG_CACHE[cache_key] = config
     return config
 
 # --- Argument Parsing ---
@@ -49,7 +132,8 @@ def parse_arguments():
     parser.add_argument(
         "--action",
         required=True,
-        choices=['create', 'drop', 'clear', 'stats', 'list_tables'],
+        choices=['create', 'create_table_only', 'create_indexes', 'drop_indexes',
+                 'drop', 'clear', 'stats', 'list_tables'],
         help="Specify the action to perform on the table(s)."
     )
     parser.add_argument(
@@ -72,86 +156,147 @@ def parse_arguments():
     return parser.parse_args()
 
 # --- Database Interaction ---
-def get_db_connection(config):
-    """Establishes a database connection."""
+def get_pool(config):
+    """Creates a connection pool sized from [DATABASE] pool_min/pool_max.
+
+    Reusing pooled connections avoids the TCP+TLS+auth handshake per
+    logical action, which dominates for the small statements this tool runs."""
     try:
-        conn = psycopg2.connect(
+        return psycopg2.pool.ThreadedConnectionPool(
+            config.getint('DATABASE', 'pool_min', fallback=1),
+            config.getint('DATABASE', 'pool_max', fallback=5),
             host=config.get('DATABASE', 'host'),
             port=config.get('DATABASE', 'port'),
             database=config.get('DATABASE', 'database'),
             user=config.get('DATABASE', 'user'),
             password=config.get('DATABASE', 'password')
         )
-        return conn
     except psycopg2.Error as e:
         print(f"Error connecting to PostgreSQL: {e}")
         return None
 
+@contextmanager
+def conn_ctx(pool):
+    """Borrows a connection from the pool for the duration of the block."""
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+# Мемоизация разрешённых имён по (id(config), ключ) и кэш положительных
+# результатов проверок существования: однажды найденные таблицы/столбцы
+# в рамках процесса повторно не опрашиваются
+_NAME_CACHE = {}
+_EXISTING_TABLES = set() # {(schema, table_name)}
+_EXISTING_COLUMNS = {} # {(schema, table_name): {column, ...}}
+
 def get_table_name(config, table_key):
-    """Gets the actual DB table name from the config."""
-    return config.get('TABLES', table_key, fallback=table_key)
+    """Gets the actual DB table name from the config (memoized)."""
+    cache_key = (id(config), 'table', table_key)
+    name = _NAME_CACHE.get(cache_key)
+    if name is None:
+        name = config.get('TABLES', table_key, fallback=table_key)
+        _NAME_CACHE[cache_key] = name
+    return name
 
 def get_db_schema(config):
-    """Gets the database schema from the config."""
-    return config.get('DATABASE', 'schema', fallback='public')
+    """Gets the database schema from the config (memoized)."""
+    cache_key = (id(config), 'schema')
+    schema = _NAME_CACHE.get(cache_key)
+    if schema is None:
+        schema = config.get('DATABASE', 'schema', fallback='public')
+        _NAME_CACHE[cache_key] = schema
+    return schema
 
 def get_all_table_keys():
     """Returns the list of standard table keys."""
     return ['bonds', 'quotas', 'coupons', 'amortizations', 'offers']
 
+def table_exists(conn, schema, table_name):
+    """Checks whether a table exists via to_regclass.
+
+    to_regclass is a single pg_class lookup by name - much cheaper than
+    the catalog joins behind information_schema.tables."""
+    if (schema, table_name) in _EXISTING_TABLES:
+        return True
+    query = "SELECT to_regclass(format('%%I.%%I', %s, %s)) IS NOT NULL;"
+    result = execute_query(conn, query, (schema, table_name), fetch=True)
+    exists = bool(result and result[0][0])
+    if exists:
+        # Кэшируем только положительный результат: таблица могла появиться позже
+        _EXISTING_TABLES.add((schema, table_name))
+    return exists
+
 def execute_query(conn, query, params=None, fetch=False):
-    """Executes a query and optionally fetches results."""
-    try:
-        with conn.cursor() as cur:
-            # print(f"Executing query: {query}") # Debug
-            # if params: print(f"With params: {params}") # Debug
-            cur.execute(query, params)
-            if fetch:
-                return cur.fetchall()
-            conn.commit()
-    except psycopg2.Error as e:
-        print(f"Database error executing query: {e}")
-        # print(f"Query: {query}") # Uncomment for debugging
-        # if params:
-        #     print(f"Params: {params}")
-        conn.rollback()
-        return None
-    except Exception as e:
-        print(f"Unexpected error executing query: {e}")
-        # print(f"Query: {query}") # Uncomment for debugging
-        # if params:
-        #     print(f"Params: {params}")
-        conn.rollback()
-        return None
+    """Executes a query and optionally fetches results.
+
+    Does not commit: callers group statements into one transaction with
+    'with conn:' (commit on success, rollback on exception), so a whole
+    action pays a single WAL fsync. Database errors propagate."""
+    with conn.cursor() as cur:
+        # print(f"Executing query: {query}") # Debug
+        # if params: print(f"With params: {params}") # Debug
+        cur.execute(query, params)
+        if fetch:
+            return cur.fetchall()
     return True
 
 # --- Actions ---
-def list_tables(conn, config):
-    """Lists all configured tables and their DB names."""
+def list_tables(conn, config, schema, table_names):
+    """Lists all configured tables and their DB names.
+
+    All existence checks go to the server as one query instead of one
+    round-trip per table. schema/table_names are resolved once in main()."""
     print("--- Configured Tables ---")
-    schema = get_db_schema(config)
-    for key in get_all_table_keys():
-        db_name = get_table_name(config, key)
-        exists_query = """
-            SELECT EXISTS (
-               SELECT FROM information_schema.tables
-               WHERE  table_schema = %s
-               AND    table_name   = %s
-            );
-        """
-        result = execute_query(conn, exists_query, (schema, db_name), fetch=True)
-        if result is not None and len(result) > 0 and len(result[0]) > 0:
-            exists = result[0][0]
-            status = "EXISTS" if exists else "NOT FOUND"
-        else:
+    keys = get_all_table_keys()
+    db_names = [table_names[key] for key in keys]
+
+    # to_regclass - прямой поиск в pg_class, без дорогих catalog-join'ов
+    # information_schema; unnest сохраняет один round-trip на все таблицы
+    exists_query = """
+        SELECT name, to_regclass(format('%%I.%%I', %s, name)) IS NOT NULL
+        FROM unnest(%s::text[]) AS name;
+    """
+    try:
+        with conn:
+            result = execute_query(conn, exists_query, (schema, db_names), fetch=True)
+        existing = {row[0] for row in result if row[1]}
+        _EXISTING_TABLES.update((schema, name) for name in existing)
+    except psycopg2.Error as e:
+        print(f"Database error listing tables: {e}")
+        existing = None
+
+    # Один write вместо print на строку: одна блокировка stdout и один flush
+    lines = []
+    for key, db_name in zip(keys, db_names):
+        if existing is None:
             status = "CHECK FAILED"
-        print(f"  {key:<15} -> {db_name:<20} ({status})")
+        else:
+            status = "EXISTS" if db_name in existing else "NOT FOUND"
+        lines.append(f"  {key:<15} -> {db_name:<20} ({status})")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
-def create_table(conn, table_key, config):
-    """Creates a specific table based on its key, reading schema from config."""
-    table_name = get_table_name(config, table_key)
-    db_schema = get_db_schema(config)
+# Столбцы, для которых создаются индексы (если присутствуют в схеме таблицы)
+_INDEX_COLS = ('secid', 'isin', 'tradedate', 'coupondate', 'amortdate', 'offerdate')
+# Шаблон компилируется один раз при импорте; в цикле подставляются только имена
+_INDEX_TMPL = "CREATE INDEX IF NOT EXISTS idx_{tn}_{col} ON {sc}.{tn} ({col});"
+
+def _build_index_statements(config, table_key, db_schema, table_name):
+    """Builds the CREATE INDEX statements for a table's indexed columns."""
+    schema_section = f"TABLE_SCHEMA:{table_key}"
+    return [
+        _INDEX_TMPL.format(tn=table_name, sc=db_schema, col=col)
+        for col in _INDEX_COLS
+        if config.has_option(schema_section, col)
+    ]
+
+def create_table_ddl(conn, table_key, config, db_schema, table_name):
+    """Creates a table (without indexes), reading its schema from config.
+
+    Split from index creation so bulk loads can follow the
+    drop indexes -> load -> recreate indexes pattern."""
     schema_section = f"TABLE_SCHEMA:{table_key}"
 
     if not config.has_section(schema_section):
@@ -169,157 +314,276 @@ def create_table(conn, table_key, config):
         return False
 
     columns_sql = ",\n".join(columns_def)
-    # Простой способ создания индекса на secid или isin, если они есть
-    index_sql_parts = []
-    if config.has_option(schema_section, 'secid'):
-         index_sql_parts.append(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_secid ON {db_schema}.{table_name} (secid);")
-    if config.has_option(schema_section, 'isin'):
-         index_sql_parts.append(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_isin ON {db_schema}.{table_name} (isin);")
-    if config.has_option(schema_section, 'tradedate'):
-         index_sql_parts.append(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_tradedate ON {db_schema}.{table_name} (tradedate);")
-    if config.has_option(schema_section, 'coupondate'):
-         index_sql_parts.append(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_coupondate ON {db_schema}.{table_name} (coupondate);")
-    if config.has_option(schema_section, 'amortdate'):
-         index_sql_parts.append(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_amortdate ON {db_schema}.{table_name} (amortdate);")
-    if config.has_option(schema_section, 'offerdate'):
-         index_sql_parts.append(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_offerdate ON {db_schema}.{table_name} (offerdate);")
-
-    index_sql = "\n".join(index_sql_parts)
-
     create_table_sql = f"""
         CREATE TABLE IF NOT EXISTS {db_schema}.{table_name} (
 {columns_sql}
         );
     """
-    full_sql = create_table_sql
-    if index_sql:
-        full_sql += "\n" + index_sql
 
     print(f"Creating table {db_schema}.{table_name}...")
     try:
-        # Разделить SQL на отдельные операторы
-        statements = [stmt.strip() for stmt in full_sql.split(';') if stmt.strip()]
-        for stmt in statements:
-            if stmt:
-                if not execute_query(conn, stmt):
-                    raise Exception(f"Failed to execute statement: {stmt[:50]}...")
+        with conn:
+            execute_query(conn, create_table_sql)
         print(f"Table {db_schema}.{table_name} created successfully (or already existed).")
         return True
-    except Exception as e:
+    except psycopg2.Error as e:
         print(f"Failed to create table {db_schema}.{table_name}: {e}")
         return False
 
+def create_table_indexes(conn, table_key, config, db_schema, table_name):
+    """Creates the standard indexes for a table."""
+    index_sql_parts = _build_index_statements(config, table_key, db_schema, table_name)
+
+    if not index_sql_parts:
+        print(f"No indexed columns configured for table {db_schema}.{table_name}.")
+        return True
+
+    print(f"Creating indexes for {db_schema}.{table_name}...")
+    try:
+        # Все индексы одной многооператорной строкой: один round-trip и один fsync
+        with conn:
+            execute_query(conn, "\n".join(index_sql_parts))
+        print(f"Indexes for {db_schema}.{table_name} created successfully (or already existed).")
+        return True
+    except psycopg2.Error as e:
+        print(f"Failed to create indexes for {db_schema}.{table_name}: {e}")
+        return False
+
+def drop_table_indexes(conn, table_key, config, db_schema, table_name):
+    """Drops the standard indexes of a table (e.g. before a bulk load)."""
+    schema_section = f"TABLE_SCHEMA:{table_key}"
+    drop_sql_parts = [
+        f"DROP INDEX IF EXISTS {db_schema}.idx_{table_name}_{col};"
+        for col in _INDEX_COLS
+        if config.has_option(schema_section, col)
+    ]
+
+    if not drop_sql_parts:
+        print(f"No indexed columns configured for table {db_schema}.{table_name}.")
+        return True
+
+    print(f"Dropping indexes for {db_schema}.{table_name}...")
+    try:
+        with conn:
+            execute_query(conn, "\n".join(drop_sql_parts))
+        print(f"Indexes for {db_schema}.{table_name} dropped successfully (if they existed).")
+        return True
+    except psycopg2.Error as e:
+        print(f"Failed to drop indexes for {db_schema}.{table_name}: {e}")
+        return False
+
+def create_table(conn, table_key, config, db_schema, table_name):
+    """Creates a specific table with its indexes."""
+    return (create_table_ddl(conn, table_key, config, db_schema, table_name)
+            and create_table_indexes(conn, table_key, config, db_schema, table_name))
+
 
-def drop_table(conn, table_key, config):
+def drop_table(conn, table_key, config, db_schema, table_name):
     """Drops a specific table."""
-    table_name = get_table_name(config, table_key)
-    db_schema = get_db_schema(config)
     query = f"DROP TABLE IF EXISTS {db_schema}.{table_name} CASCADE;"
     print(f"Dropping table {db_schema}.{table_name}...")
-    result = execute_query(conn, query)
-    if result:
+    try:
+        with conn:
+            execute_query(conn, query)
         print(f"Table {db_schema}.{table_name} dropped successfully (if it existed).")
-    else:
-        print(f"Failed to drop table {db_schema}.{table_name}.")
-    return result
+        return True
+    except psycopg2.Error as e:
+        print(f"Failed to drop table {db_schema}.{table_name}: {e}")
+        return False
 
-def clear_table(conn, table_key, config):
+def clear_table(conn, table_key, config, db_schema, table_name):
     """Clears (TRUNCATE) a specific table."""
-    table_name = get_table_name(config, table_key)
-    db_schema = get_db_schema(config)
     query = f"TRUNCATE TABLE {db_schema}.{table_name};"
     print(f"Clearing table {db_schema}.{table_name}...")
-    result = execute_query(conn, query)
-    if result:
+    try:
+        with conn:
+            execute_query(conn, query)
         print(f"Table {db_schema}.{table_name} cleared successfully.")
-    else:
-        print(f"Failed to clear table {db_schema}.{table_name}.")
-    return result
+        return True
+    except psycopg2.Error as e:
+        print(f"Failed to clear table {db_schema}.{table_name}: {e}")
+        return False
 
-def gather_statistics(conn, table_key, config):
-    """Gathers statistics for a specific table."""
-    table_name = get_table_name(config, table_key)
-    db_schema = get_db_schema(config)
+def drop_tables(conn, db_schema, table_names):
+    """Drops several tables in a single DROP statement.
 
-    print(f"--- Statistics for table: {db_schema}.{table_name} ---")
+    One round-trip and one transaction instead of a statement per table;
+    used when the action runs without --table."""
+    qualified = [f"{db_schema}.{name}" for name in table_names]
+    query = f"DROP TABLE IF EXISTS {', '.join(qualified)} CASCADE;"
+    print(f"Dropping tables {', '.join(qualified)}...")
+    try:
+        with conn:
+            execute_query(conn, query)
+        print("Tables dropped successfully (if they existed).")
+        return True
+    except psycopg2.Error as e:
+        print(f"Failed to drop tables: {e}")
+        return False
+
+def clear_tables(conn, db_schema, table_names):
+    """Clears (TRUNCATE) several tables in a single TRUNCATE statement.
+
+    A multi-table TRUNCATE is atomic and avoids a round-trip per table;
+    used when the action runs without --table."""
+    qualified = [f"{db_schema}.{name}" for name in table_names]
+    query = f"TRUNCATE TABLE {', '.join(qualified)};"
+    print(f"Clearing tables {', '.join(qualified)}...")
+    try:
+        with conn:
+            execute_query(conn, query)
+        print("Tables cleared successfully.")
+        return True
+    except psycopg2.Error as e:
+        print(f"Failed to clear tables: {e}")
+        return False
+
+# Соединения (по id), на которых уже выполнен PREPARE служебных запросов
+_PREPARED_CONNS = set()
+_COLUMNS_STMT = "stmt_table_columns"
 
-    # 1. Total row count
-    count_query = f"SELECT COUNT(*) FROM {db_schema}.{table_name};"
-    result = execute_query(conn, count_query, params=None, fetch=True)
-    if result is not None and len(result) > 0:
-        print(f"  Total Rows: {result[0][0]}")
+def _prepare_columns_stmt(conn):
+    """Prepares the table-columns lookup once per connection.
+
+    'stats' runs the same catalog query for every table; PREPARE/EXECUTE
+    skips re-parsing and re-planning it on each call."""
+    if id(conn) in _PREPARED_CONNS:
+        return
+    with conn:
+        execute_query(conn, f"""
+            PREPARE {_COLUMNS_STMT} (text, text) AS
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_schema = $1
+            AND table_name = $2;
+        """)
+    _PREPARED_CONNS.add(id(conn))
+
+# Наличие расширения hll, проверенное один раз на соединение (по id)
+_HLL_AVAILABLE = {}
+
+def _hll_available(conn):
+    """Checks once per connection whether the hll extension is installed."""
+    available = _HLL_AVAILABLE.get(id(conn))
+    if available is None:
+        try:
+            with conn:
+                result = execute_query(conn, "SELECT 1 FROM pg_extension WHERE extname = 'hll';", fetch=True)
+            available = bool(result)
+        except psycopg2.Error:
+            available = False
+        _HLL_AVAILABLE[id(conn)] = available
+    return available
+
+@functools.lru_cache(maxsize=None)
+def _compiled_stats_sql(db_schema, table_name, cols, approx_distinct=False, approx_rows=False):
+    """Builds the fused statistics query for a (schema, table, column set).
+
+    cols is a frozenset of the table's columns. Returns (sql, date_col,
+    key_col). With approx_distinct the distinct count uses a HyperLogLog
+    sketch (hll extension) instead of a full hash aggregation; with
+    approx_rows the row count comes from the pg_class.reltuples estimate
+    instead of a COUNT(*) scan. Memoized so repeated stats runs in one
+    process (e.g. a scheduler calling main() in a loop) reuse the
+    compiled string."""
+    full_table_name = f"{db_schema}.{table_name}"
+    date_col = next((c for c in ['tradedate', 'coupondate', 'amortdate', 'offerdate', 'matdate'] if c in cols), None)
+    key_col = next((c for c in ['isin', 'secid'] if c in cols), None)
+
+    if approx_rows:
+        select_parts = [f"(SELECT reltuples::bigint FROM pg_class WHERE oid = '{full_table_name}'::regclass)"]
     else:
-        print("  Failed to get row count.")
-
-    # 2. Row count by date (if applicable)
-    date_columns = ['tradedate', 'coupondate', 'amortdate', 'offerdate', 'matdate']
-    date_stats_found = False
-    for date_col in date_columns:
-        check_col_query = """
-            SELECT EXISTS (
-                SELECT 1
-                FROM information_schema.columns
-                WHERE table_schema = %s
-                AND table_name = %s
-                AND column_name = %s
-            );
-        """
-        col_exists_result = execute_query(conn, check_col_query, (db_schema, table_name, date_col), fetch=True)
-        if col_exists_result is not None and len(col_exists_result) > 0 and col_exists_result[0][0]:
-            date_count_query = f"""
-                SELECT {date_col}, COUNT(*) as cnt
-                FROM {db_schema}.{table_name}
+        select_parts = [f"(SELECT COUNT(*) FROM {full_table_name})"]
+    if key_col and approx_distinct:
+        select_parts.append(f"(SELECT hll_cardinality(hll_add_agg(hll_hash_text({key_col}::text)))::bigint FROM {full_table_name})")
+    elif key_col:
+        select_parts.append(f"(SELECT COUNT(DISTINCT {key_col}) FROM {full_table_name})")
+    else:
+        select_parts.append("NULL::bigint")
+    select_parts.append("(SELECT pg_size_pretty(pg_total_relation_size(%s)))")
+    if date_col:
+        select_parts.append(f"""ARRAY(
+            SELECT {date_col}::text || '|' || cnt::text
+            FROM (
+                SELECT {date_col}, COUNT(*) AS cnt
+                FROM {full_table_name}
                 WHERE {date_col} IS NOT NULL
                 GROUP BY {date_col}
                 ORDER BY {date_col} DESC
-                LIMIT 10;
-            """
-            date_result = execute_query(conn, date_count_query, params=None, fetch=True)
-            if date_result is not None:
-                print(f"  Recent entries by {date_col}:")
-                for row in date_result:
-                    print(f"    {row[0]}: {row[1]} rows")
-                date_stats_found = True
-                break
-            else:
-                print(f"  Failed to get date statistics for {date_col}.")
-    if not date_stats_found:
-        print("  No standard date column found for recent entry statistics.")
+                LIMIT 10
+            ) recent
+        )""")
+    else:
+        select_parts.append("NULL::text[]")
 
-    # 3. Distinct ISIN/SECID count (common key)
-    key_columns_to_check = ['isin', 'secid']
-    key_stats_found = False
-    for key_col in key_columns_to_check:
-        key_check_query = """
-            SELECT EXISTS (
-                SELECT 1
-                FROM information_schema.columns
-                WHERE table_schema = %s
-                AND table_name = %s
-                AND column_name = %s
-            );
-        """
-        key_exists_result = execute_query(conn, key_check_query, (db_schema, table_name, key_col), fetch=True)
-        if key_exists_result is not None and len(key_exists_result) > 0 and key_exists_result[0][0]:
-            key_count_query = f"SELECT COUNT(DISTINCT {key_col}) FROM {db_schema}.{table_name};"
-            key_result = execute_query(conn, key_count_query, params=None, fetch=True)
-            if key_result is not None and len(key_result) > 0:
-                 print(f"  Distinct {key_col.upper()}s: {key_result[0][0]}")
-                 key_stats_found = True
-                 break
-            else:
-                 print(f"  Failed to get distinct {key_col.upper()} count.")
-    if not key_stats_found:
-        print("  No standard key column ('isin', 'secid') found for distinct count.")
+    return "SELECT " + ", ".join(select_parts) + ";", date_col, key_col
+
+def gather_statistics(conn, table_key, config, db_schema, table_name):
+    """Gathers statistics for a specific table."""
 
-    # 4. Table size (approximate)
-    size_query = "SELECT pg_size_pretty(pg_total_relation_size(%s));"
+    print(f"--- Statistics for table: {db_schema}.{table_name} ---")
+
+    # 0. Получить множество столбцов таблицы одним запросом (подготовленным
+    # один раз на соединение) - дальше все проверки наличия столбцов
+    # выполняются в памяти
+    cols = _EXISTING_COLUMNS.get((db_schema, table_name))
+    if cols is None:
+        try:
+            _prepare_columns_stmt(conn)
+            with conn:
+                columns_result = execute_query(conn, f"EXECUTE {_COLUMNS_STMT} (%s, %s);", (db_schema, table_name), fetch=True)
+            cols = {row[0] for row in columns_result}
+        except psycopg2.Error as e:
+            print(f"  Failed to read table columns: {e}")
+            print("--- End Statistics ---\n")
+            return False
+        if cols:
+            _EXISTING_COLUMNS[(db_schema, table_name)] = cols
+
+    # 1-4. Все метрики (число строк, уникальные ключи, размер, свежие даты)
+    # забираются одним запросом: один round-trip вместо четырёх, а COUNT(*) и
+    # COUNT(DISTINCT) делят прочитанные буферы между собой
+    # [STATS] distinct_mode = approx заменяет COUNT(DISTINCT) на оценку
+    # через hll (если расширение установлено); точный подсчёт - по умолчанию
+    distinct_mode = config.get('STATS', 'distinct_mode', fallback='exact')
+    approx_distinct = distinct_mode == 'approx' and _hll_available(conn)
+    # [STATS] row_count_mode = approx берёт оценку из pg_class.reltuples
+    # (O(1), обновляется ANALYZE) вместо полного скана COUNT(*)
+    approx_rows = config.get('STATS', 'row_count_mode', fallback='exact') == 'approx'
     full_table_name = f"{db_schema}.{table_name}"
-    size_result = execute_query(conn, size_query, (full_table_name,), fetch=True)
-    if size_result is not None and len(size_result) > 0 and len(size_result[0]) > 0:
-        print(f"  Table Size (approx.): {size_result[0][0]}")
+    stats_query, date_col, key_col = _compiled_stats_sql(db_schema, table_name, frozenset(cols), approx_distinct, approx_rows)
+    try:
+        with conn:
+            result = execute_query(conn, stats_query, (full_table_name,), fetch=True)
+    except psycopg2.Error as e:
+        print(f"  Failed to gather statistics: {e}")
+        print("--- End Statistics ---\n")
+        return False
+    if not result:
+        print("  Failed to gather statistics.")
+        print("--- End Statistics ---\n")
+        return False
+
+    total_rows, distinct_keys, table_size, recent_dates = result[0]
+    print(f"  {'Approx Rows' if approx_rows else 'Total Rows'}: {total_rows}")
+
+    if date_col is None:
+        print("  No standard date column found for recent entry statistics.")
     else:
-         print("  Failed to get table size.")
+        print(f"  Recent entries by {date_col}:")
+        if recent_dates:
+            # Одним write вместо print на дату
+            sys.stdout.write("\n".join(
+                "    {}: {} rows".format(*entry.rsplit('|', 1)) for entry in recent_dates
+            ) + "\n")
+
+    if key_col is None:
+        print("  No standard key column ('isin', 'secid') found for distinct count.")
+    else:
+        approx_label = " (approx)" if approx_distinct else ""
+        print(f"  Distinct {key_col.upper()}s{approx_label}: {distinct_keys}")
+
+    print(f"  Table Size (approx.): {table_size}")
 
     print("--- End Statistics ---\n")
     return True
@@ -329,31 +593,59 @@ def main():
     args = parse_arguments()
     config = load_config(args.config, args.secrets)
 
-    conn = get_db_connection(config)
-    if not conn:
+    # Имена схемы и таблиц разрешаем один раз, а не на каждой итерации
+    db_schema = get_db_schema(config)
+    table_names = {key: get_table_name(config, key) for key in get_all_table_keys()}
+
+    pool = get_pool(config)
+    if not pool:
         return
 
     try:
         if args.action == 'list_tables':
-            list_tables(conn, config)
+            with conn_ctx(pool) as conn:
+                list_tables(conn, config, db_schema, table_names)
             return
 
         tables_to_process = [args.table] if args.table else get_all_table_keys()
 
+        # Для drop/clear без --table все таблицы обрабатываются одним
+        # многотабличным оператором вместо цикла
+        if args.table is None and args.action in ('drop', 'clear'):
+            bulk_fn = drop_tables if args.action == 'drop' else clear_tables
+            with conn_ctx(pool) as conn:
+                success = bulk_fn(conn, db_schema, [table_names[k] for k in tables_to_process])
+            if not success:
+                print(f"Some operations for action '{args.action}' failed.")
+                sys.exit(1)
+            print(f"Action '{args.action}' completed successfully for table(s): {', '.join(tables_to_process)}")
+            return
+
         success = True
-        for table_key in tables_to_process:
-            if args.action == 'create':
-                if not create_table(conn, table_key, config):
-                    success = False
-            elif args.action == 'drop':
-                if not drop_table(conn, table_key, config):
-                    success = False
-            elif args.action == 'clear':
-                if not clear_table(conn, table_key, config):
-                    success = False
-            elif args.action == 'stats':
-                if not gather_statistics(conn, table_key, config):
-                    pass # Continue processing others
+        with conn_ctx(pool) as conn:
+            for table_key in tables_to_process:
+                table_name = table_names[table_key]
+                if args.action == 'create':
+                    if not create_table(conn, table_key, config, db_schema, table_name):
+                        success = False
+                elif args.action == 'create_table_only':
+                    if not create_table_ddl(conn, table_key, config, db_schema, table_name):
+                        success = False
+                elif args.action == 'create_indexes':
+                    if not create_table_indexes(conn, table_key, config, db_schema, table_name):
+                        success = False
+                elif args.action == 'drop_indexes':
+                    if not drop_table_indexes(conn, table_key, config, db_schema, table_name):
+                        success = False
+                elif args.action == 'drop':
+                    if not drop_table(conn, table_key, config, db_schema, table_name):
+                        success = False
+                elif args.action == 'clear':
+                    if not clear_table(conn, table_key, config, db_schema, table_name):
+                        success = False
+                elif args.action == 'stats':
+                    if not gather_statistics(conn, table_key, config, db_schema, table_name):
+                        pass # Continue processing others
 
         if not success:
             print(f"Some operations for action '{args.action}' failed.")
@@ -363,9 +655,8 @@ def main():
             print(f"Action '{args.action}' completed successfully for table(s): {processed_tables}")
 
     finally:
-        if conn:
-            conn.close()
-            print("Database connection closed.")
+        pool.closeall()
+        print("Database connection pool closed.")
 
 if __name__ == "__main__":
     main()